@@ -17,10 +17,68 @@ Metrics functions using numpy arrays.
 """
 import numpy as np
 
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+    prange = range
+
 Forecast = np.ndarray
 Target = np.ndarray
 
 
+def _mase_kernel(forecast: Forecast, insample: np.ndarray, outsample: Target, frequency: int) -> float:
+    """
+    MASE of a single timeseries computed with explicit loops to be compiled by numba.
+
+    :param forecast: Forecast values. Shape: time_o
+    :param insample: Insample values. Shape: time_i
+    :param outsample: Target values. Shape: time_o
+    :param frequency: Frequency value
+    :return: MASE value
+    """
+    if len(insample) <= frequency:
+        # no seasonal errors, the mean of an empty array is NaN in numpy.
+        return np.nan
+    forecast_error = 0.0
+    for i in range(len(forecast)):
+        forecast_error += abs(forecast[i] - outsample[i])
+    seasonal_error = 0.0
+    for i in range(frequency, len(insample)):
+        seasonal_error += abs(insample[i] - insample[i - frequency])
+    return (forecast_error / len(forecast)) / (seasonal_error / (len(insample) - frequency))
+
+
+def _mase_batch_kernel(forecast: Forecast,
+                       insample: np.ndarray,
+                       insample_offsets: np.ndarray,
+                       outsample: Target,
+                       frequency: int) -> np.ndarray:
+    """
+    MASE of each timeseries in a batch, timeseries are processed in parallel when compiled by numba.
+
+    :param forecast: Forecast values. Shape: batch, time_o
+    :param insample: Insample values of all timeseries concatenated. Shape: total time_i
+    :param insample_offsets: Insample start of each timeseries followed by the total length. Shape: batch + 1
+    :param outsample: Target values. Shape: batch, time_o
+    :param frequency: Frequency value
+    :return: MASE of each timeseries. Shape: batch
+    """
+    result = np.empty(forecast.shape[0])
+    for i in prange(forecast.shape[0]):
+        result[i] = _mase_kernel(forecast[i],
+                                 insample[insample_offsets[i]:insample_offsets[i + 1]],
+                                 outsample[i],
+                                 frequency)
+    return result
+
+
+if njit is not None:
+    # numpy error model makes division by zero return inf or NaN, as the numpy implementation does.
+    _mase_kernel = njit(cache=True, error_model='numpy')(_mase_kernel)
+    _mase_batch_kernel = njit(cache=True, error_model='numpy', parallel=True)(_mase_batch_kernel)
+
+
 def mase(forecast: Forecast, insample: np.ndarray, outsample: Target, frequency: int) -> np.ndarray:
     """
     MASE loss as defined in "Scaled Errors" https://robjhyndman.com/papers/mase.pdf
@@ -31,9 +89,46 @@ def mase(forecast: Forecast, insample: np.ndarray, outsample: Target, frequency:
     :param frequency: Frequency value
     :return: Same shape array with error calculated for each time step
     """
+    if (njit is not None and np.ndim(forecast) == 1 and np.ndim(insample) == 1
+            and np.shape(forecast) == np.shape(outsample)):
+        return _mase_kernel(forecast, insample, outsample, frequency)
     return np.mean(np.abs(forecast - outsample)) / np.mean(np.abs(insample[:-frequency] - insample[frequency:]))
 
 
+def mase_batch(forecast: Forecast,
+               insample: np.ndarray,
+               insample_offsets: np.ndarray,
+               outsample: Target,
+               frequency: int) -> np.ndarray:
+    """
+    MASE loss (see mase) of each timeseries in a batch with insample values of different lengths.
+
+    :param forecast: Forecast values. Shape: batch, time_o
+    :param insample: Insample values of all timeseries concatenated. Shape: total time_i
+    :param insample_offsets: Insample start of each timeseries followed by the total length. Shape: batch + 1
+    :param outsample: Target values. Shape: batch, time_o
+    :param frequency: Frequency value
+    :return: MASE of each timeseries. Shape: batch
+    """
+    if np.shape(forecast) != np.shape(outsample):
+        raise ValueError(f'Forecast shape {np.shape(forecast)} does not match target shape {np.shape(outsample)}')
+    if len(insample_offsets) != len(forecast) + 1 or insample_offsets[-1] > len(insample):
+        raise ValueError(f'Insample offsets do not match {len(forecast)} timeseries of total length {len(insample)}')
+    if njit is not None:
+        return _mase_batch_kernel(forecast, insample, insample_offsets, outsample, frequency)
+    starts, ends = insample_offsets[:-1], insample_offsets[1:]
+    seasonal_lengths = ends - starts - frequency
+    # seasonal errors are padded with zero, so that the last timeseries end is a valid reduceat index.
+    seasonal_errors = np.append(np.abs(insample[:-frequency] - insample[frequency:]), 0.0)
+    # reduce over [start, end - frequency) of each timeseries, dropping errors across timeseries boundaries.
+    # bounds of timeseries not longer than frequency are clipped to valid indices, their scale is NaN.
+    bounds = np.stack([starts, np.maximum(ends - frequency, starts)], axis=1).ravel()
+    seasonal_sums = np.add.reduceat(seasonal_errors, np.minimum(bounds, len(seasonal_errors) - 1))[::2]
+    scale = np.full(len(seasonal_sums), np.nan)
+    np.divide(seasonal_sums, seasonal_lengths, out=scale, where=seasonal_lengths > 0)
+    return np.mean(np.abs(forecast - outsample), axis=1) / scale
+
+
 def nd(forecast: Forecast, target: Target) -> float:
     """
     Normalized deviation as defined in https://www.cs.utexas.edu/~rofuyu/papers/tr-mf-nips.pdf
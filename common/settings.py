@@ -20,4 +20,5 @@ import os
 STORAGE=os.getenv('STORAGE')
 DATASETS_PATH=os.path.join(STORAGE, 'datasets')
 EXPERIMENTS_PATH=os.path.join(STORAGE, 'experiments')
-TESTS_STORAGE_PATH=os.path.join(STORAGE, 'test')
\ No newline at end of file
+TESTS_STORAGE_PATH=os.path.join(STORAGE, 'test')
+CSV_ENGINE=os.getenv('CSV_ENGINE', 'c')
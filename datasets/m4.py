@@ -17,17 +17,26 @@ M4 Dataset
 """
 import logging
 import os
-from collections import OrderedDict
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from functools import lru_cache
 from glob import glob
+from typing import Dict, Iterator
 
 import numpy as np
 import pandas as pd
 import patoolib
 from tqdm import tqdm
 
+try:
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa_csv = None
+
 from common.http_utils import download, url_file_name
-from common.settings import DATASETS_PATH
+from common.settings import CSV_ENGINE, DATASETS_PATH
 
 TRAINING_DATASET_URL = 'https://www.m4.unic.ac.cy/wp-content/uploads/2017/12/M4DataSet.zip'
 TEST_DATASET_URL = 'https://www.m4.unic.ac.cy/wp-content/uploads/2018/07/M-test-set.zip'
@@ -42,6 +51,17 @@ INFO_FILE_PATH = os.path.join(DATASET_PATH, url_file_name(INFO_URL))
 NAIVE2_FORECAST_FILE_PATH = os.path.join(DATASET_PATH, 'submission-Naive2.csv')
 
 
+CSV_CHUNK_SIZE = 4096
+
+INFO_CACHE_FILE_PATH = os.path.join(DATASET_PATH, 'info.npz')
+INFO_COLUMNS = ['M4id', 'SP', 'Frequency', 'Horizon']
+
+TRAINING_VALUES_CACHE_FILE_PATH = os.path.join(DATASET_PATH, 'training_values.npy')
+TRAINING_OFFSETS_CACHE_FILE_PATH = os.path.join(DATASET_PATH, 'training_offsets.npy')
+TEST_VALUES_CACHE_FILE_PATH = os.path.join(DATASET_PATH, 'test_values.npy')
+TEST_OFFSETS_CACHE_FILE_PATH = os.path.join(DATASET_PATH, 'test_offsets.npy')
+
+# Legacy caches of pickled timeseries arrays.
 TRAINING_DATASET_CACHE_FILE_PATH = os.path.join(DATASET_PATH, 'training.npz')
 TEST_DATASET_CACHE_FILE_PATH = os.path.join(DATASET_PATH, 'test.npz')
 
@@ -53,6 +73,8 @@ class M4Dataset:
     frequencies: np.ndarray
     horizons: np.ndarray
     values: np.ndarray
+    flat_values: np.ndarray
+    offsets: np.ndarray
 
     @staticmethod
     def load(training: bool = True) -> 'M4Dataset':
@@ -61,14 +83,25 @@ class M4Dataset:
 
         :param training: Load training part if training is True, test part otherwise.
         """
-        m4_info = pd.read_csv(INFO_FILE_PATH)
-        return M4Dataset(ids=m4_info.M4id.values,
-                         groups=m4_info.SP.values,
-                         frequencies=m4_info.Frequency.values,
-                         horizons=m4_info.Horizon.values,
-                         values=np.load(
-                             TRAINING_DATASET_CACHE_FILE_PATH if training else TEST_DATASET_CACHE_FILE_PATH,
-                             allow_pickle=True))
+        m4_info = load_m4_info_columns()
+        try:
+            # values are memory mapped, timeseries are paged in when accessed.
+            flat_values = np.load(TRAINING_VALUES_CACHE_FILE_PATH if training else TEST_VALUES_CACHE_FILE_PATH,
+                                  mmap_mode='r')
+            offsets = np.load(TRAINING_OFFSETS_CACHE_FILE_PATH if training else TEST_OFFSETS_CACHE_FILE_PATH)
+        except FileNotFoundError:
+            logging.warning('Legacy M4 cache format, values are loaded into memory.')
+            legacy_values = np.load(TRAINING_DATASET_CACHE_FILE_PATH if training else TEST_DATASET_CACHE_FILE_PATH,
+                                    allow_pickle=True)
+            flat_values = np.concatenate(legacy_values)
+            offsets = np.concatenate([[0], np.cumsum([len(ts) for ts in legacy_values])])
+        return M4Dataset(ids=m4_info['M4id'],
+                         groups=m4_info['SP'],
+                         frequencies=m4_info['Frequency'],
+                         horizons=m4_info['Horizon'],
+                         values=np.array(np.split(flat_values, offsets[1:-1]), dtype=object),
+                         flat_values=flat_values,
+                         offsets=offsets)
 
     @staticmethod
     def download() -> None:
@@ -80,25 +113,27 @@ class M4Dataset:
             return
 
         download(INFO_URL, INFO_FILE_PATH)
-        m4_ids = pd.read_csv(INFO_FILE_PATH).M4id.values
+        m4_ids = m4_info_ids()
+        id_to_idx = {m4id: i for i, m4id in enumerate(m4_ids)}
 
-        def build_cache(files: str, cache_path: str) -> None:
-            timeseries_dict = OrderedDict(list(zip(m4_ids, [[]] * len(m4_ids))))
+        def build_cache(files: str, values_cache_path: str, offsets_cache_path: str) -> None:
+            timeseries = [np.empty(0, dtype=np.float32)] * len(m4_ids)
             logging.info(f'Caching {files}')
-            for train_csv in tqdm(glob(os.path.join(DATASET_PATH, files))):
-                dataset = pd.read_csv(train_csv)
-                dataset.set_index(dataset.columns[0], inplace=True)
-                for m4id, row in dataset.iterrows():
-                    values = row.values
-                    timeseries_dict[m4id] = values[~np.isnan(values)]
-            np.array(list(timeseries_dict.values())).dump(cache_path)
+            csv_files = glob(os.path.join(DATASET_PATH, files))
+            with ProcessPoolExecutor() as executor:
+                for csv_timeseries in tqdm(executor.map(parse_timeseries_csv, csv_files), total=len(csv_files)):
+                    for m4id, values in csv_timeseries.items():
+                        timeseries[id_to_idx[m4id]] = values
+            # timeseries are stored concatenated, the i-th timeseries is values[offsets[i]:offsets[i + 1]].
+            np.save(values_cache_path, np.concatenate(timeseries).astype(np.float32))
+            np.save(offsets_cache_path, np.concatenate([[0], np.cumsum([len(ts) for ts in timeseries])]))
 
         download(TRAINING_DATASET_URL, TRAINING_DATASET_FILE_PATH)
-        patoolib.extract_archive(TRAINING_DATASET_FILE_PATH, outdir=DATASET_PATH)
-        build_cache('*-train.csv', TRAINING_DATASET_CACHE_FILE_PATH)
+        extract_zip(TRAINING_DATASET_FILE_PATH, DATASET_PATH)
+        build_cache('*-train.csv', TRAINING_VALUES_CACHE_FILE_PATH, TRAINING_OFFSETS_CACHE_FILE_PATH)
         download(TEST_DATASET_URL, TEST_DATASET_FILE_PATH)
-        patoolib.extract_archive(TEST_DATASET_FILE_PATH, outdir=DATASET_PATH)
-        build_cache('*-test.csv', TEST_DATASET_CACHE_FILE_PATH)
+        extract_zip(TEST_DATASET_FILE_PATH, DATASET_PATH)
+        build_cache('*-test.csv', TEST_VALUES_CACHE_FILE_PATH, TEST_OFFSETS_CACHE_FILE_PATH)
 
         naive2_archive = os.path.join(DATASET_PATH, url_file_name(NAIVE2_FORECAST_URL))
         download(NAIVE2_FORECAST_URL, naive2_archive)
@@ -126,6 +161,9 @@ class M4Meta:
         'Daily': 1,
         'Hourly': 24
     }
+    seasonal_pattern_ordinals = {seasonal_pattern: i for i, seasonal_pattern in enumerate(seasonal_patterns)}
+    horizons_array = np.array(horizons, dtype=np.int32)
+    frequencies_array = np.array(frequencies, dtype=np.int32)
 
 def load_m4_info() -> pd.DataFrame:
     """
@@ -133,4 +171,111 @@ def load_m4_info() -> pd.DataFrame:
 
     :return: Pandas DataFrame of M4Info.
     """
+    if pa_csv is not None:
+        return pa_csv.read_csv(INFO_FILE_PATH).to_pandas()
     return pd.read_csv(INFO_FILE_PATH)
+
+
+@lru_cache(maxsize=None)
+def m4_info_ids() -> np.ndarray:
+    """
+    Load ids from M4Info file, parsed once per process.
+
+    :return: M4 ids.
+    """
+    return pd.read_csv(INFO_FILE_PATH, usecols=['M4id'])['M4id'].values
+
+
+def load_m4_info_columns() -> Dict[str, np.ndarray]:
+    """
+    Load M4id, SP, Frequency and Horizon columns of M4Info file.
+    The columns are cached and the cache is refreshed when M4Info file is modified.
+
+    :return: Column values by column name.
+    """
+    info_mtime = os.path.getmtime(INFO_FILE_PATH)
+    if os.path.isfile(INFO_CACHE_FILE_PATH):
+        with np.load(INFO_CACHE_FILE_PATH) as cache:
+            if cache['mtime'] == info_mtime:
+                return {column: cache[column] for column in INFO_COLUMNS}
+
+    if pa_csv is not None:
+        m4_info = pa_csv.read_csv(INFO_FILE_PATH, convert_options=pa_csv.ConvertOptions(include_columns=INFO_COLUMNS))
+        columns = {column: m4_info.column(column).to_numpy() for column in INFO_COLUMNS}
+    else:
+        m4_info = pd.read_csv(INFO_FILE_PATH, usecols=INFO_COLUMNS)
+        columns = {column: m4_info[column].values for column in INFO_COLUMNS}
+    # strings are stored as unicode arrays, so that the cache is loaded without pickle.
+    columns = {column: values.astype(str) if values.dtype == object else values for column, values in columns.items()}
+    # the cache is written to a temporary file and moved in place, concurrent loads never see a partial cache.
+    try:
+        file_descriptor, temporary_path = tempfile.mkstemp(suffix='.npz', dir=os.path.dirname(INFO_CACHE_FILE_PATH))
+    except OSError:
+        logging.info(f'skip: cannot write {INFO_CACHE_FILE_PATH}.')
+        return columns
+    try:
+        with os.fdopen(file_descriptor, 'wb') as cache_file:
+            np.savez(cache_file, mtime=info_mtime, **columns)
+        os.replace(temporary_path, INFO_CACHE_FILE_PATH)
+    except OSError:
+        logging.info(f'skip: cannot write {INFO_CACHE_FILE_PATH}.')
+        os.remove(temporary_path)
+    return columns
+
+
+def extract_zip(file_path: str, directory: str) -> None:
+    """
+    Extract zip archive.
+
+    :param file_path: Path to the zip archive.
+    :param directory: Directory to extract to.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        archive.extractall(directory)
+
+
+def timeseries_csv_dtypes(file_path: str) -> Dict[str, type]:
+    """
+    Column types of M4 timeseries file: string ids followed by float32 values.
+
+    :param file_path: Path to the csv file.
+    :return: Type by column name.
+    """
+    columns = pd.read_csv(file_path, nrows=0).columns
+    return {columns[0]: str, **{column: np.float32 for column in columns[1:]}}
+
+
+def read_timeseries_csv(file_path: str) -> Iterator[pd.DataFrame]:
+    """
+    Read M4 timeseries file in chunks of CSV_CHUNK_SIZE rows. The CSV_ENGINE setting enables the pyarrow parser
+    (if installed), which does not support chunks and reads the whole file at once.
+
+    :param file_path: Path to the csv file.
+    :return: Pandas DataFrames of float32 values indexed by M4 ids.
+    """
+    if CSV_ENGINE == 'pyarrow' and pa_csv is not None:
+        dataset = pa_csv.read_csv(file_path).to_pandas()
+        yield dataset.set_index(dataset.columns[0]).astype(np.float32)
+        return
+    yield from pd.read_csv(file_path,
+                           index_col=0,
+                           dtype=timeseries_csv_dtypes(file_path),
+                           engine='c',
+                           na_filter=True,
+                           memory_map=True,
+                           chunksize=CSV_CHUNK_SIZE)
+
+
+def parse_timeseries_csv(file_path: str) -> Dict[str, np.ndarray]:
+    """
+    Parse M4 timeseries file and clean timeseries from NaNs and infinite values.
+
+    :param file_path: Path to the csv file.
+    :return: Timeseries by M4 id.
+    """
+    timeseries = {}
+    for chunk in read_timeseries_csv(file_path):
+        values = chunk.values
+        mask = np.isfinite(values)
+        timeseries.update(zip(chunk.index.values, np.split(values[mask], np.cumsum(mask.sum(axis=1))[:-1])))
+    return timeseries
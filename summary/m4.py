@@ -16,13 +16,14 @@
 M4 Summary
 """
 from collections import OrderedDict
+from typing import Dict
 
 import numpy as np
 import pandas as pd
 
-from common.metrics import mase, smape_2
-from datasets.m4 import M4Dataset, NAIVE2_FORECAST_FILE_PATH
-from summary.utils import group_values
+from common.metrics import mase_batch, smape_2
+from datasets.m4 import M4Dataset, M4Meta, NAIVE2_FORECAST_FILE_PATH, timeseries_csv_dtypes
+from summary.utils import pad_nans, take_timeseries
 
 
 class M4Summary:
@@ -30,55 +31,75 @@ class M4Summary:
         self.training_set = M4Dataset.load(training=True)
         self.test_set = M4Dataset.load(training=False)
 
+        # timeseries ordered by group, the indices of each group are a slice of the order.
+        self.group_order = np.argsort(self.test_set.groups, kind='stable')
+        sorted_groups = self.test_set.groups[self.group_order]
+        self.unique_groups = sorted_groups[np.concatenate([[True], sorted_groups[1:] != sorted_groups[:-1]])]
+        self.group_starts = np.searchsorted(sorted_groups, self.unique_groups, side='left')
+        self.group_ends = np.searchsorted(sorted_groups, self.unique_groups, side='right')
+        self.group_idx = {group_name: self.group_order[start:end]
+                          for group_name, start, end in zip(self.unique_groups, self.group_starts, self.group_ends)}
+        self.group_counts = {group_name: len(idx) for group_name, idx in self.group_idx.items()}
+        self.target_values = pad_nans(self.test_set.flat_values, self.test_set.offsets)
+        self._naive2_forecasts = None
+
+    @property
+    def naive2_forecasts(self) -> np.ndarray:
+        """
+        Naive2 forecasts padded with NaNs, parsed on first access.
+
+        :return: Naive2 forecasts. Shape: timeseries, time.
+        """
+        if self._naive2_forecasts is None:
+            self._naive2_forecasts = pd.read_csv(NAIVE2_FORECAST_FILE_PATH,
+                                                 index_col=0,
+                                                 dtype=timeseries_csv_dtypes(NAIVE2_FORECAST_FILE_PATH)).values
+        return self._naive2_forecasts
+
     def evaluate(self, forecast: np.ndarray):
         """
         Evaluate forecasts using M4 test dataset.
 
-        :param forecast: Forecasts. Shape: timeseries, time.
+        :param forecast: Forecasts padded with NaNs. Shape: timeseries, time.
         :return: sMAPE and OWA grouped by seasonal patterns.
         """
-        forecast = np.array([v[~np.isnan(v)] for v in forecast])
-
-        grouped_smapes = {group_name:
-                              np.mean(smape_2(forecast=group_values(values=forecast,
-                                                                    groups=self.test_set.groups,
-                                                                    group_name=group_name),
-                                              target=group_values(values=self.test_set.values,
-                                                                  groups=self.test_set.groups,
-                                                                  group_name=group_name)))
-                          for group_name in np.unique(self.test_set.groups)}
-        grouped_smapes = self.summarize_groups(grouped_smapes)
+        model_smapes = np.nanmean(smape_2(forecast=forecast, target=self.target_values), axis=1)
+        grouped_smapes = self.summarize_groups(self.group_means(model_smapes))
 
         grouped_owa = OrderedDict()
 
-        naive2_forecasts = pd.read_csv(NAIVE2_FORECAST_FILE_PATH).values[:, 1:].astype(np.float32)
-        naive2_forecasts = np.array([v[~np.isnan(v)] for v in naive2_forecasts])
-
-        model_mases = {}
-        naive2_smapes = {}
-        naive2_mases = {}
-        for group_name in np.unique(self.test_set.groups):
-            model_forecast = group_values(forecast, self.test_set.groups, group_name)
-            naive2_forecast = group_values(naive2_forecasts, self.test_set.groups, group_name)
-
-            target = group_values(self.test_set.values, self.test_set.groups, group_name)
-            # all timeseries within group have same frequency
-            frequency = self.training_set.frequencies[self.test_set.groups == group_name][0]
-            insample = group_values(self.training_set.values, self.test_set.groups, group_name)
-
-            model_mases[group_name] = np.mean([mase(forecast=model_forecast[i],
-                                                    insample=insample[i],
-                                                    outsample=target[i],
-                                                    frequency=frequency) for i in range(len(model_forecast))])
-            naive2_mases[group_name] = np.mean([mase(forecast=naive2_forecast[i],
-                                                     insample=insample[i],
-                                                     outsample=target[i],
-                                                     frequency=frequency) for i in range(len(model_forecast))])
-
-            naive2_smapes[group_name] = np.mean(smape_2(naive2_forecast, target))
-        grouped_model_mases = self.summarize_groups(model_mases)
-        grouped_naive2_smapes = self.summarize_groups(naive2_smapes)
-        grouped_naive2_mases = self.summarize_groups(naive2_mases)
+        naive2_forecasts = self.naive2_forecasts
+        naive2_smapes = np.nanmean(smape_2(forecast=naive2_forecasts, target=self.target_values), axis=1)
+
+        model_mases = np.empty(len(forecast))
+        naive2_mases = np.empty(len(forecast))
+        for group_name in self.unique_groups:
+            group_idx = self.group_idx[group_name]
+            # all timeseries within group have same horizon and frequency
+            group_ordinal = M4Meta.seasonal_pattern_ordinals[group_name]
+            horizon = M4Meta.horizons_array[group_ordinal]
+            frequency = M4Meta.frequencies_array[group_ordinal]
+            model_forecast = forecast[group_idx, :horizon]
+            naive2_forecast = naive2_forecasts[group_idx, :horizon]
+
+            target = self.target_values[group_idx, :horizon]
+            insample, insample_offsets = take_timeseries(self.training_set.flat_values,
+                                                         self.training_set.offsets,
+                                                         group_idx)
+
+            model_mases[group_idx] = mase_batch(forecast=model_forecast,
+                                                insample=insample,
+                                                insample_offsets=insample_offsets,
+                                                outsample=target,
+                                                frequency=frequency)
+            naive2_mases[group_idx] = mase_batch(forecast=naive2_forecast,
+                                                 insample=insample,
+                                                 insample_offsets=insample_offsets,
+                                                 outsample=target,
+                                                 frequency=frequency)
+        grouped_model_mases = self.summarize_groups(self.group_means(model_mases))
+        grouped_naive2_smapes = self.summarize_groups(self.group_means(naive2_smapes))
+        grouped_naive2_mases = self.summarize_groups(self.group_means(naive2_mases))
         for k in grouped_model_mases.keys():
             grouped_owa[k] = (grouped_model_mases[k] / grouped_naive2_mases[k] +
                               grouped_smapes[k] / grouped_naive2_smapes[k]) / 2
@@ -86,6 +107,16 @@ class M4Summary:
             return dict(map(lambda kv: (kv[0], np.round(kv[1], 3)), d.items()))
         return round_all(grouped_smapes), round_all(grouped_owa)
 
+    def group_means(self, values: np.ndarray) -> Dict[str, float]:
+        """
+        Average values of timeseries within each group.
+
+        :param values: Values of timeseries. Shape: timeseries
+        :return: Mean value per group.
+        """
+        group_sums = np.add.reduceat(values[self.group_order], self.group_starts)
+        return dict(zip(self.unique_groups, group_sums / (self.group_ends - self.group_starts)))
+
     def summarize_groups(self, scores):
         """
         Re-group scores respecting M4 rules.
@@ -94,23 +125,20 @@ class M4Summary:
         """
         scores_summary = OrderedDict()
 
-        def group_count(group_name):
-            return len(np.where(self.test_set.groups == group_name)[0])
-
         weighted_score = {}
         for g in ['Yearly', 'Quarterly', 'Monthly']:
-            weighted_score[g] = scores[g] * group_count(g)
+            weighted_score[g] = scores[g] * self.group_counts[g]
             scores_summary[g] = scores[g]
 
         others_score = 0
         others_count = 0
         for g in ['Weekly', 'Daily', 'Hourly']:
-            others_score += scores[g] * group_count(g)
-            others_count += group_count(g)
+            others_score += scores[g] * self.group_counts[g]
+            others_count += self.group_counts[g]
         weighted_score['Others'] = others_score
         scores_summary['Others'] = others_score / others_count
 
-        average = np.sum(list(weighted_score.values())) / len(self.test_set.groups)
+        average = sum(weighted_score.values()) / len(self.test_set.groups)
         scores_summary['Average'] = average
 
         return scores_summary
@@ -17,6 +17,7 @@ Frequently used functions for building summaries.
 """
 import os
 from glob import glob
+from typing import Tuple
 
 import numpy as np
 import pandas as pd
@@ -50,3 +51,31 @@ def group_values(values: np.ndarray, groups: np.ndarray, group_name: str) -> np.
     :return: Filtered and cleaned timeseries.
     """
     return np.array([v[~np.isnan(v)] for v in values[groups == group_name]])
+
+def pad_nans(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """
+    Stack timeseries of different lengths padding them with NaNs.
+
+    :param values: Concatenated timeseries values.
+    :param offsets: Start of each timeseries followed by the total length.
+    :return: Timeseries padded with NaNs. Shape: timeseries, max length.
+    """
+    lengths = np.diff(offsets)
+    padded = np.full((len(lengths), np.max(lengths)), np.nan, dtype=values.dtype)
+    padded[np.arange(padded.shape[1]) < lengths[:, None]] = values[offsets[0]:offsets[-1]]
+    return padded
+
+def take_timeseries(values: np.ndarray, offsets: np.ndarray, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Select timeseries from concatenated timeseries values.
+
+    :param values: Concatenated timeseries values.
+    :param offsets: Start of each timeseries followed by the total length.
+    :param indices: Indices of timeseries to select.
+    :return: Concatenated values of selected timeseries and their offsets.
+    """
+    starts = offsets[indices]
+    lengths = offsets[indices + 1] - starts
+    subset_offsets = np.concatenate([[0], np.cumsum(lengths)])
+    positions = np.arange(subset_offsets[-1]) + np.repeat(starts - subset_offsets[:-1], lengths)
+    return np.take(values, positions), subset_offsets
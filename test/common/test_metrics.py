@@ -0,0 +1,111 @@
+# This source code is provided for the purposes of scientific reproducibility
+# under the following limited license from Element AI Inc. The code is an
+# implementation of the N-BEATS model (Oreshkin et al., N-BEATS: Neural basis
+# expansion analysis for interpretable time series forecasting,
+# https://arxiv.org/abs/1905.10437). The copyright to the source code is
+# licensed under the Creative Commons - Attribution-NonCommercial 4.0
+# International license (CC BY-NC 4.0):
+# https://creativecommons.org/licenses/by-nc/4.0/.  Any commercial use (whether
+# for the benefit of third parties or internally in production) requires an
+# explicit license. The subject-matter of the N-BEATS model and associated
+# materials are the property of Element AI Inc. and may be subject to patent
+# protection. No license to patents is granted hereunder (whether express or
+# implied). Copyright © 2020 Element AI Inc. All rights reserved.
+
+"""
+Metrics unit tests.
+"""
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from common import metrics
+from common.metrics import mase, mase_batch
+
+
+class TestMase(unittest.TestCase):
+    def test_constant_insample(self):
+        with np.errstate(divide='ignore'):
+            self.assertEqual(mase(forecast=np.array([1.0, 2.0]),
+                                  insample=np.ones(10),
+                                  outsample=np.array([2.0, 2.0]),
+                                  frequency=1), np.inf)
+
+
+    def test_mismatched_lengths(self):
+        with self.assertRaises(ValueError):
+            mase(forecast=np.array([1.0, 2.0, 3.0]),
+                 insample=np.arange(10.0),
+                 outsample=np.array([1.0, 2.0]),
+                 frequency=1)
+        # outsample of length 1 is broadcast as in numpy.
+        self.assertAlmostEqual(mase(forecast=np.array([1.0, 2.0, 3.0]),
+                                    insample=np.arange(10.0),
+                                    outsample=np.array([2.0]),
+                                    frequency=1), 2.0 / 3.0)
+
+
+class TestMaseBatch(unittest.TestCase):
+    def setUp(self) -> None:
+        random = np.random.RandomState(42)
+        self.frequency = 4
+        lengths = [9, 12, 6, 20, 7]
+        self.insample = [random.uniform(1, 10, size=length) for length in lengths]
+        self.insample_offsets = np.concatenate([[0], np.cumsum(lengths)])
+        self.forecast = random.uniform(1, 10, size=(len(lengths), 3))
+        self.outsample = random.uniform(1, 10, size=(len(lengths), 3))
+
+    def test_matches_mase(self):
+        expected = [mase(forecast=self.forecast[i],
+                         insample=self.insample[i],
+                         outsample=self.outsample[i],
+                         frequency=self.frequency) for i in range(len(self.insample))]
+        result = mase_batch(forecast=self.forecast,
+                            insample=np.concatenate(self.insample),
+                            insample_offsets=self.insample_offsets,
+                            outsample=self.outsample,
+                            frequency=self.frequency)
+        # the last timeseries ends exactly at the final offset.
+        self.assertEqual(self.insample_offsets[-1], len(np.concatenate(self.insample)))
+        self.assertTrue(np.allclose(result, expected))
+
+    def test_short_insample(self):
+        # insample of the 1st timeseries is shorter than frequency and of the 3rd one equals frequency.
+        insample = np.arange(17.0)
+        insample_offsets = np.array([0, 3, 13, 17])
+        with mock.patch.object(metrics, 'njit', None):
+            result = mase_batch(self.forecast[:3], insample, insample_offsets, self.outsample[:3], self.frequency)
+        self.assertTrue(np.isnan(result[0]))
+        self.assertTrue(np.isnan(result[2]))
+        self.assertTrue(np.allclose(result[1], mase(self.forecast[1], insample[3:13], self.outsample[1], 4)))
+
+    def test_mismatched_shapes(self):
+        insample = np.concatenate(self.insample)
+        with self.assertRaises(ValueError):
+            mase_batch(self.forecast, insample, self.insample_offsets, self.outsample[:, :2], self.frequency)
+        with self.assertRaises(ValueError):
+            mase_batch(self.forecast, insample[:-1], self.insample_offsets, self.outsample, self.frequency)
+        with self.assertRaises(ValueError):
+            mase_batch(self.forecast, insample, self.insample_offsets[:-1], self.outsample, self.frequency)
+
+    @unittest.skipIf(metrics.njit is None, 'numba is not installed')
+    def test_numba_matches_numpy(self):
+        # constant insample of the 4th timeseries has zero scale.
+        self.insample[3] = np.full(len(self.insample[3]), 5.0)
+        # insample of the 2nd timeseries is shorter than frequency and of the 5th one equals frequency.
+        self.insample[1] = self.insample[1][:2]
+        self.insample[4] = self.insample[4][:self.frequency]
+        insample = np.concatenate(self.insample)
+        insample_offsets = np.concatenate([[0], np.cumsum([len(ts) for ts in self.insample])])
+        with np.errstate(divide='ignore'):
+            with mock.patch.object(metrics, 'njit', None):
+                expected = mase_batch(self.forecast, insample, insample_offsets, self.outsample, self.frequency)
+            result = mase_batch(self.forecast, insample, insample_offsets, self.outsample, self.frequency)
+        self.assertEqual(expected[3], np.inf)
+        self.assertTrue(np.isnan(expected[1]) and np.isnan(expected[4]))
+        self.assertTrue(np.allclose(result, expected, equal_nan=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
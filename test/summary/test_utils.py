@@ -0,0 +1,45 @@
+# This source code is provided for the purposes of scientific reproducibility
+# under the following limited license from Element AI Inc. The code is an
+# implementation of the N-BEATS model (Oreshkin et al., N-BEATS: Neural basis
+# expansion analysis for interpretable time series forecasting,
+# https://arxiv.org/abs/1905.10437). The copyright to the source code is
+# licensed under the Creative Commons - Attribution-NonCommercial 4.0
+# International license (CC BY-NC 4.0):
+# https://creativecommons.org/licenses/by-nc/4.0/.  Any commercial use (whether
+# for the benefit of third parties or internally in production) requires an
+# explicit license. The subject-matter of the N-BEATS model and associated
+# materials are the property of Element AI Inc. and may be subject to patent
+# protection. No license to patents is granted hereunder (whether express or
+# implied). Copyright © 2020 Element AI Inc. All rights reserved.
+
+"""
+Summary utils unit tests.
+"""
+import unittest
+
+import numpy as np
+
+from summary.utils import pad_nans, take_timeseries
+
+
+class TestPadNans(unittest.TestCase):
+    def test_uneven_lengths(self):
+        values = np.array([1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+        offsets = np.array([0, 2, 3, 6])
+        expected = np.array([[1.0, 2.0, np.nan],
+                             [3.0, np.nan, np.nan],
+                             [4.0, 5.0, 6.0]])
+        np.testing.assert_array_equal(pad_nans(values, offsets), expected)
+
+
+class TestTakeTimeseries(unittest.TestCase):
+    def test_unsorted_indices(self):
+        values = np.array([1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0])
+        offsets = np.array([0, 2, 3, 6, 7])
+        subset_values, subset_offsets = take_timeseries(values, offsets, np.array([3, 0, 2]))
+        np.testing.assert_array_equal(subset_values, [7.0, 1.0, 2.0, 4.0, 5.0, 6.0])
+        np.testing.assert_array_equal(subset_offsets, [0, 1, 3, 6])
+
+
+if __name__ == '__main__':
+    unittest.main()